@@ -1,22 +1,114 @@
-import librosa
+import functools
+import os
 import numpy as np
+import soundfile as sf
 import time
+import torch
+import torchaudio
 
-def extract_edge_features(audio_path, sample_rate=16000):
+@functools.lru_cache(maxsize=4)
+def _get_mfcc(sample_rate):
+    """
+    Builds the MFCC transform once per sample rate so the mel filterbank and DCT matrix are reused.
+    Settings mirror librosa.feature.mfcc's defaults (n_fft=2048, hop=512, 128 Slaney mels, 80 dB top_db),
+    including zero padding for centred frames, so clips shorter than n_fft still work.
+    """
+    return torchaudio.transforms.MFCC(
+        sample_rate=sample_rate,
+        n_mfcc=13,
+        melkwargs={"n_fft": 2048, "hop_length": 512, "n_mels": 128,
+                   "mel_scale": "slaney", "norm": "slaney", "pad_mode": "constant"},
+    )
+
+@functools.lru_cache(maxsize=4)
+def _get_mel_basis(sample_rate):
+    """
+    Mel filterbank matching librosa.feature.mfcc's defaults, built once per sample rate.
+    """
+    import librosa
+
+    return librosa.filters.mel(sr=sample_rate, n_fft=2048, n_mels=128).astype(np.float32)
+
+def _log_mel(power_spec, mel_basis):
+    """
+    Projects an STFT power spectrum onto the mel filterbank and converts to dB (like librosa.power_to_db
+    with top_db=None). Compiled by _get_log_mel_kernel; not meant to be called directly.
+    """
+    n_mels, n_bins = mel_basis.shape
+    n_frames = power_spec.shape[1]
+    log_mel = np.zeros((n_mels, n_frames), dtype=np.float32)
+
+    # Mel projection as a tight loop, walking both matrices row-wise
+    for m in range(n_mels):
+        for k in range(n_bins):
+            w = mel_basis[m, k]
+            if w != 0.0:
+                for t in range(n_frames):
+                    log_mel[m, t] += w * power_spec[k, t]
+
+    for m in range(n_mels):
+        for t in range(n_frames):
+            log_mel[m, t] = 10.0 * np.log10(max(log_mel[m, t], 1e-10))
+    return log_mel
+
+@functools.lru_cache(maxsize=1)
+def _get_log_mel_kernel():
+    """
+    JIT-compiles _log_mel on first use so numba is only needed for the use_numba path.
+    The first call pays ~1s, later runs load the cached build from __pycache__.
+    """
+    from numba import njit
+
+    # Explicit fast-math flags: 'ninf'/'nnan' are left out so no assumptions are made about special values
+    return njit(fastmath={'nsz', 'arcp', 'contract', 'afn', 'reassoc'}, cache=True)(_log_mel)
+
+def _mfcc_numba(y, sr, n_mfcc=13):
+    """
+    MFCCs via the numba log-mel kernel, clipped to 80 dB below the peak (like librosa), then a scipy DCT.
+    """
+    import librosa
+    import scipy.fft
+
+    power_spec = np.abs(librosa.stft(y, n_fft=2048, hop_length=512)) ** 2
+    # librosa.stft is Fortran-ordered; make it C-ordered so the kernel's inner loop is contiguous
+    power_spec = np.ascontiguousarray(power_spec, dtype=np.float32)
+    log_mel = _get_log_mel_kernel()(power_spec, _get_mel_basis(sr))
+    np.maximum(log_mel, log_mel.max() - 80.0, out=log_mel)
+    return scipy.fft.dct(log_mel, type=2, norm='ortho', axis=0)[:n_mfcc]
+
+def extract_edge_features(audio_path, sample_rate=16000, use_numba=False):
     """
     Simulates the Sound Analytics lab:
     1. Loads audio at 16kHz (The 'Edge Standard' from Lab 4).
     2. Extracts MFCCs (The 'Fingerprint' from Lab 5).
     3. Flattens for Edge Profiling.
+    Set `use_numba` to compute MFCCs with the numba JIT log-mel path instead of torchaudio.
     """
     print(f"Loading {audio_path} at {sample_rate}Hz...")
     
     # Load audio - Lab 4 benchmarking shows 16k is better for Edge efficiency
-    y, sr = librosa.load(audio_path, sr=sample_rate)
+    if not os.path.exists(audio_path):
+        # soundfile reports a missing file as a generic libsndfile error
+        raise FileNotFoundError(audio_path)
+
+    # libsndfile reads straight to float32; only resample if the file isn't already 16k
+    y, sr = sf.read(audio_path, dtype='float32', always_2d=False)
+    if y.ndim > 1:
+        y = y.mean(axis=1)
+    if sr != sample_rate:
+        # Imported here so the default 16k path doesn't pay librosa's startup cost
+        import librosa
+
+        y = librosa.resample(y, orig_sr=sr, target_sr=sample_rate, res_type='soxr_hq')
+        sr = sample_rate
 
     # Extract MFCCs - Lab 5 explains this is the 'texture/timbre' of the sound
     # Using 13 coefficients as it's lightweight for microcontrollers
-    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+    if use_numba:
+        mfccs = _mfcc_numba(y, sr)
+    else:
+        # torchaudio keeps the filterbank/DCT cached and runs the FFT in libtorch
+        mfccs = _get_mfcc(sr)(torch.from_numpy(y)).numpy()
     
     # Calculate the mean MFCC across time to create a fixed-size feature vector
     # This vector represents the sound in just 13 numbers!
@@ -27,13 +119,29 @@ def extract_edge_features(audio_path, sample_rate=16000):
 def export_to_header(feature_vector, var_name, filename="audio_features.h"):
     """
     Exports the sound 'fingerprint' to a C header for the Profiling Lab.
+    Values are stored as int8 with one float scale (4x smaller, no FPU needed to compare).
     """
+    # Symmetric per-vector quantization: value ~= q * scale
+    feature_vector = np.asarray(feature_vector, dtype=np.float32)
+    scale = float(np.max(np.abs(feature_vector))) / 127.0
+    if scale == 0.0:
+        scale = 1.0
+    q = np.round(feature_vector / scale).astype(np.int8)
+
+    # 9 significant digits round-trip a float32 exactly; keep it a valid C float literal
+    scale_literal = f"{np.float32(scale):.9g}"
+    if "." not in scale_literal and "e" not in scale_literal:
+        scale_literal += ".0"
+
     with open(filename, "w") as f:
         f.write(f"#ifndef {var_name.upper()}_H\n#define {var_name.upper()}_H\n\n")
-        f.write(f"// Extracted MFCC Feature Vector (13 coefficients)\n")
-        f.write(f"const float {var_name}[13] = {{\n")
-        f.write("    " + ", ".join([f"{x:.4f}f" for x in feature_vector]) + "\n")
-        f.write("};\n\n#endif")
+        f.write("#include <stdint.h>\n\n")
+        f.write(f"// Extracted MFCC Feature Vector (13 coefficients, int8 quantized)\n")
+        f.write(f"// Dequantize with: {var_name}[i] * {var_name}_scale\n")
+        f.write(f"const int8_t {var_name}[{len(q)}] = {{\n")
+        f.write("    " + ", ".join([f"{x}" for x in q]) + "\n")
+        f.write("};\n")
+        f.write(f"const float {var_name}_scale = {scale_literal}f;\n\n#endif")
     print(f"✅ Success: Exported {var_name} to {filename}")
 
 if __name__ == "__main__":
@@ -1,15 +1,19 @@
+import math
+import os
 import torch
 import torchvision.models as models
 import cv2
 import time
 import numpy as np
 
-def load_optimized_model(quantize=True):
+def load_optimized_model(quantize=True, precision='fp32'):
     """
     Represents Lab 2 & 3: Loading a model optimized for Edge devices.
+    precision='fp16' moves the FP32 model to the GPU in half precision when CUDA is available.
     """
     if quantize:
         # Quantized models use INT8 weights to save memory and speed up CPU cycles
+        # Note: QNNPACK/FBGEMM only beat FP32 on a net this small when single-threaded (see __main__)
         print("Using Quantized MobileNetV2 (Int8) - Lab Optimization Active")
         model = models.quantization.mobilenet_v2(weights='DEFAULT', quantize=True)
     else:
@@ -17,36 +21,209 @@ def load_optimized_model(quantize=True):
         model = models.mobilenet_v2(weights='DEFAULT')
     
     model.eval()
+
+    if not quantize:
+        if precision == 'fp16':
+            if torch.cuda.is_available():
+                # FP16 doubles throughput on tensor-core GPUs (Volta/Ampere, Jetson)
+                print("Running in FP16 on CUDA")
+                model = model.half().cuda()
+            else:
+                print("⚠️ FP16 requested but CUDA is not available. Running in FP32 on the CPU.")
+
+        # Channels-last (NHWC) gives depthwise convs better vectorization on MKLDNN/cuDNN.
+        # Skipped for INT8: QNNPACK does not support it.
+        model = model.to(memory_format=torch.channels_last)
+
+        # TorchInductor fuses Conv-BN-ReLU, cutting per-op dispatch. 'reduce-overhead' only
+        # adds CUDA graph replay, so the CPU/RPi path uses the default mode.
+        # Skipped for INT8: quantized ops have limited inductor support.
+        mode = 'reduce-overhead' if next(model.parameters()).is_cuda else 'default'
+        try:
+            model = torch.compile(model, mode=mode, fullgraph=True, backend='inductor')
+        except Exception as e:
+            print(f"⚠️ torch.compile unavailable ({type(e).__name__}: {e}). Running in eager mode.")
+
     return model
 
+def load_onnx_model(quantize=True, onnx_path="mnv2.onnx"):
+    """
+    Represents Lab 3 on x86: ONNX Runtime (or OpenVINO) usually beats PyTorch's native INT8 kernels.
+    The FP32 export and the INT8 model are cached to disk, so only the first run pays for them.
+    INT8 calibration uses random-noise frames, so its activation ranges are meaningless:
+    the INT8 ONNX model is for timing comparisons only, not for accurate predictions.
+    """
+    # Imported here so the default PyTorch path doesn't pay onnxruntime's startup cost
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class SyntheticCalibrationReader(CalibrationDataReader):
+        """
+        Feeds a handful of synthetic frames to ONNX Runtime's static INT8 calibration.
+        """
+        def __init__(self, num_frames=16):
+            resized = np.empty((224, 224, 3), dtype=np.uint8)
+            frames = (np.random.randint(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(num_frames))
+            self._batches = iter([{'input': preprocess_frame(f, resized).numpy()} for f in frames])
+
+        def get_next(self):
+            return next(self._batches, None)
+
+    # Match PyTorch's thread counts so the USE_ONNX vs PyTorch comparison is like for like
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = torch.get_num_threads()
+    options.inter_op_num_threads = torch.get_num_interop_threads()
+
+    if not os.path.exists(onnx_path):
+        model = models.mobilenet_v2(weights='DEFAULT').eval()
+        dummy = torch.zeros(1, 3, 224, 224)
+        torch.onnx.export(model, dummy, onnx_path, opset_version=13,
+                          input_names=['input'], output_names=['output'],
+                          dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}})
+
+    if quantize:
+        root, ext = os.path.splitext(onnx_path)
+        int8_path = f"{root}_int8{ext or '.onnx'}"
+        if not os.path.exists(int8_path):
+            quantize_static(onnx_path, int8_path, SyntheticCalibrationReader(),
+                            quant_format=QuantFormat.QDQ, per_channel=True,
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+        onnx_path = int8_path
+        print("Using ONNX Runtime MobileNetV2 (Int8) - Lab Optimization Active")
+    else:
+        print("Using ONNX Runtime MobileNetV2 (FP32)")
+
+    # Prefer OpenVINO when the onnxruntime-openvino build is installed, else the default CPU provider
+    available = ort.get_available_providers()
+    providers = [p for p in ('OpenVINOExecutionProvider', 'CPUExecutionProvider') if p in available]
+    return ort.InferenceSession(onnx_path, options, providers=providers)
+
+def warm_up(model, dummy):
+    """
+    Runs a few untimed calls so compile cost stays out of the profile.
+    If torch.compile fails on the first call (Inductor's CPU backend needs a C++ toolchain
+    and Python headers), falls back to the eager model and returns it.
+    """
+    with torch.inference_mode():
+        try:
+            model(dummy)
+        except Exception as e:
+            if not hasattr(model, '_orig_mod'):
+                raise
+            print(f"⚠️ torch.compile failed ({type(e).__name__}: {e}). Falling back to eager mode.")
+            model = model._orig_mod
+            model(dummy)
+
+        for _ in range(2):
+            model(dummy)
+    return model
+
+def preprocess_frame(frame, resized=None, out=None):
+    """
+    Resizes a BGR frame to the 224x224 RGB tensor MobileNetV2 expects.
+    Pass a preallocated (224, 224, 3) uint8 buffer as `resized` to reuse it across frames.
+    Pass a (1, 3, 224, 224) float32 or float16 tensor as `out` (e.g. pinned memory, or a
+    channels-last slice of a batch) to write into it instead; its layout is kept.
+    """
+    if resized is None:
+        resized = np.empty((224, 224, 3), dtype=np.uint8)
+
+    # Resize and BGR->RGB swap both write into the same uint8 buffer (no new allocations)
+    cv2.resize(frame, (224, 224), dst=resized)
+    cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=resized)
+
+    # HWC -> NCHW is a zero-copy view; the uint8 -> float cast and 1/255 scale
+    # are written in a single pass straight into the output layout
+    pixels = torch.from_numpy(resized).permute(2, 0, 1).unsqueeze(0)
+    if out is None:
+        out = torch.empty((1, 3, 224, 224), dtype=torch.float32)
+    torch.mul(pixels, 1.0 / 255.0, out=out)
+    return out
+
 def run_dl_profiling():
     # Toggle this to compare optimized vs unoptimized in your profiling report
     USE_QUANTIZATION = True 
-    
-    model = load_optimized_model(quantize=USE_QUANTIZATION)
+    # Toggle this to run the same model through ONNX Runtime instead of native PyTorch
+    USE_ONNX = False
+    # Toggle this to run the FP32 PyTorch model in half precision on a CUDA GPU
+    USE_FP16 = False
+    # Frames per inference call; set to 1 to profile unbatched, single-image latency
+    BATCH_SIZE = 8
+
+    if USE_ONNX:
+        session = load_onnx_model(quantize=USE_QUANTIZATION)
+
+        def model(input_tensor):
+            return session.run(None, {'input': input_tensor.numpy()})[0]
+    else:
+        model = load_optimized_model(quantize=USE_QUANTIZATION, precision='fp16' if USE_FP16 else 'fp32')
+
+    # Only the compiled FP32 PyTorch model is converted to channels-last
+    use_channels_last = not USE_QUANTIZATION and not USE_ONNX
+    use_fp16 = use_channels_last and USE_FP16 and torch.cuda.is_available()
+    if USE_FP16 and not use_channels_last:
+        print("⚠️ USE_FP16 only applies to the FP32 PyTorch model. "
+              "Set USE_QUANTIZATION and USE_ONNX to False to use it.")
     
     print("Generating synthetic workload for profiling...")
+
+    # Reused resize destination so pre-processing doesn't allocate per frame
+    resized = np.empty((224, 224, 3), dtype=np.uint8)
+
+    # Batch buffer each frame is pre-processed into (no per-batch stack/cat copy).
+    # On the GPU it is pinned and already FP16 in the model's layout, so it is the
+    # direct source of an asynchronous host-to-GPU copy (no dtype conversion on the host).
+    memory_format = torch.channels_last if use_channels_last else torch.contiguous_format
+    batch = torch.empty((BATCH_SIZE, 3, 224, 224), dtype=torch.float16 if use_fp16 else torch.float32,
+                        pin_memory=use_fp16, memory_format=memory_format)
+
+    # Warm-up: the first calls pay the compile cost, keep them out of the timed loop
+    dummy = torch.zeros(BATCH_SIZE, 3, 224, 224)
+    if use_channels_last:
+        dummy = dummy.contiguous(memory_format=torch.channels_last)
+    if use_fp16:
+        dummy = dummy.to('cuda', torch.float16)
+    model = warm_up(model, dummy)
     
-    # 100-frame loop to gather stable hardware metrics
-    for i in range(100):
-        # Create synthetic 640x480 frame (no camera needed)
-        frame = np.random.randint(0, 256, (480, 640, 3), dtype=np.uint8)
-        
+    # Create synthetic 640x480 frames once (no camera needed) so RNG work stays out of the profile
+    frames = [np.random.randint(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(4)]
+
+    # At least 100 frames to gather stable hardware metrics, in full batches only
+    # (a smaller final batch would change the input shape and trigger a recompile)
+    num_batches = math.ceil(100 / BATCH_SIZE)
+    print(f"Profiling {num_batches} batches x {BATCH_SIZE} frames = {num_batches * BATCH_SIZE} frames")
+    for b in range(num_batches):
         start = time.perf_counter()
 
         # Pre-processing: Resize to 224x224 (The size MobileNetV2 expects)
-        input_img = cv2.resize(frame, (224, 224))
-        input_tensor = torch.from_numpy(input_img).permute(2, 0, 1).float().unsqueeze(0) / 255.0
+        for j in range(BATCH_SIZE):
+            # Rotate through the pre-generated frames
+            frame = frames[(b * BATCH_SIZE + j) & 3]
+            preprocess_frame(frame, resized, out=batch[j:j + 1])
+
+        input_tensor = batch
+        if use_fp16:
+            input_tensor = input_tensor.to('cuda', non_blocking=True)
         
         # Inference: The core workload for 'perf' and 'cProfile' to track
-        with torch.no_grad():
+        with torch.inference_mode():
             output = model(input_tensor)
+
+        # GPU work is asynchronous; wait for it so the latency below is real
+        if use_fp16:
+            torch.cuda.synchronize()
             
         end = time.perf_counter()
-        fps = 1 / (end - start)
+        fps = BATCH_SIZE / (end - start)
         
-        if i % 20 == 0:
-            print(f"Frame {i} | Latency: {(end-start)*1000:.2f}ms | FPS: {fps:.2f}")
+        if b % max(1, 20 // BATCH_SIZE) == 0:
+            print(f"Batch {b} ({BATCH_SIZE} frames) | Latency: {(end-start)*1000:.2f}ms | "
+                  f"Amortized per frame: {(end-start)*1000/BATCH_SIZE:.2f}ms | FPS: {fps:.2f}")
 
 if __name__ == "__main__":
+    # Single-stream, latency-bound workload: multithreaded dispatch overhead dominates on small nets.
+    # Set here rather than at import: set_num_interop_threads raises once torch has started
+    # inter-op work, and importers shouldn't have their threading changed.
+    torch.set_num_threads(1)
+    torch.set_num_interop_threads(1)
     run_dl_profiling()
@@ -1,25 +1,56 @@
+import functools
+import os
 import cv2
 import numpy as np
 
+# Downscale factors libjpeg can apply during decode (DCT-domain scaling, skips most IDCT work).
+# JPEG only: for other formats OpenCV decodes at full size and then resizes with
+# INTER_LINEAR_EXACT, which aliases more than INTER_AREA.
+_REDUCED_READ_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+@functools.lru_cache(maxsize=8)
+def _get_hog(win_size):
+    """
+    Builds the HoG descriptor once per window size; only winSize depends on the input.
+    """
+    return cv2.HOGDescriptor(_winSize=win_size,
+                             _blockSize=(16, 16),
+                             _blockStride=(8, 8),
+                             _cellSize=(8, 8),
+                             _nbins=9)
+
 def process_and_save_image(image_path, output_filename="processed_edge.jpg", downscale_factor=2):
     """
     1. Loads or generates a synthetic image.
-    2. Converts to Grayscale and downscales for Edge efficiency.
+    2. Downscales and converts to Grayscale for Edge efficiency.
     3. Runs HoG feature extraction.
     4. Saves the resulting pre-processed image to a JPG file.
     """
-    # Load image
-    img = cv2.imread(image_path)
+    # Load image - for JPEGs and supported factors the decoder downscales for us.
+    # libjpeg rounds up, so an odd width/height gives ceil(w / f) rather than w // f (1px larger).
+    read_flag = None
+    if os.path.splitext(image_path)[1].lower() in (".jpg", ".jpeg"):
+        read_flag = _REDUCED_READ_FLAGS.get(downscale_factor)
+    img = cv2.imread(image_path, cv2.IMREAD_COLOR if read_flag is None else read_flag)
     if img is None:
         print(f"⚠️ {image_path} not found. Generating synthetic image...")
         img = np.random.randint(0, 256, (480, 640, 3), dtype=np.uint8)
+        read_flag = None
 
-    # 1. Grayscale Conversion
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    # 1. Downscaling (The 'Informed Decision' to reduce CPU cycles)
+    # Done first so the grayscale pass only touches the smaller image
+    if read_flag is not None:
+        resized_bgr = img
+    else:
+        new_size = (img.shape[1] // downscale_factor, img.shape[0] // downscale_factor)
+        resized_bgr = cv2.resize(img, new_size, interpolation=cv2.INTER_AREA)
 
-    # 2. Downscaling (The 'Informed Decision' to reduce CPU cycles)
-    new_size = (gray.shape[1] // downscale_factor, gray.shape[0] // downscale_factor)
-    resized = cv2.resize(gray, new_size, interpolation=cv2.INTER_AREA)
+    # 2. Grayscale Conversion
+    resized = cv2.cvtColor(resized_bgr, cv2.COLOR_BGR2GRAY)
 
     # 3. Save the processed image to JPG
     # This allows students to visually inspect the downscaled/gray version
@@ -27,14 +58,12 @@ def process_and_save_image(image_path, output_filename="processed_edge.jpg", dow
     print(f"✅ Processed image saved to: {output_filename}")
 
     # 4. HoG Feature Extraction (OpenCV Implementation)
-    win_size = (resized.shape[1] // 8 * 8, resized.shape[0] // 8 * 8)
-    resized_hog = cv2.resize(resized, win_size)
+    # Crop (zero-copy view) to a multiple of the 8px cell size instead of resizing again
+    h8, w8 = resized.shape[0] // 8 * 8, resized.shape[1] // 8 * 8
+    win_size = (w8, h8)
+    resized_hog = resized[:h8, :w8]
     
-    hog = cv2.HOGDescriptor(_winSize=win_size,
-                            _blockSize=(16, 16),
-                            _blockStride=(8, 8),
-                            _cellSize=(8, 8),
-                            _nbins=9)
+    hog = _get_hog(win_size)
     
     features = hog.compute(resized_hog)
     print(f"Extracted {len(features)} HoG features.")